@@ -7,153 +7,724 @@ Automatically installs dependencies and exposes the server via localtunnel.
 import os
 import sys
 import subprocess
+import shutil
 import threading
+import queue
 import time
 import platform
+import functools
+from operator import itemgetter
+from collections import OrderedDict
+import socket
+import signal
+import ctypes
+import traceback
+import selectors
+import io
+import stat
+import posixpath
 from pathlib import Path
-from datetime import datetime
-from http.server import HTTPServer, SimpleHTTPRequestHandler
+from datetime import datetime, timezone
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
 import urllib.parse
 import json
+import logging
+import logging.handlers
+import re
+import html
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib encoder
+    orjson = None
+
+
+def json_bytes(obj):
+    """Serialize obj to UTF-8 JSON bytes, preferring orjson when available."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj)
+        except orjson.JSONEncodeError:
+            # orjson rejects lone surrogates, which is how os.scandir()
+            # hands back names that are not valid UTF-8; the stdlib
+            # encoder escapes them as \udcXX instead.
+            pass
+    return json.dumps(obj, default=_json_default).encode('utf-8')
+
+
+def _json_default(obj):
+    """Encode values the stdlib json module does not handle natively."""
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+# Request threads only enqueue log records; a listener thread formats them
+# and writes them to stdout. The queue handler is attached only together
+# with its listener, so records are never queued with nothing draining them.
+_log = logging.getLogger("filebrowser")
+_log.setLevel(logging.INFO)
+_log.propagate = False
+_LOG_LOCK = threading.Lock()
+_LOG_LISTENER = None
+# Process that started _LOG_LISTENER; a forked child needs its own.
+_LOG_PID = None
+
+
+def start_log_listener():
+    """Start draining request logs to stdout, once per process."""
+    global _LOG_LISTENER, _LOG_PID
+    with _LOG_LOCK:
+        if _LOG_PID != os.getpid():
+            log_queue = queue.SimpleQueue()
+            for handler in list(_log.handlers):
+                _log.removeHandler(handler)
+            _log.addHandler(logging.handlers.QueueHandler(log_queue))
+            stdout_handler = logging.StreamHandler(sys.stdout)
+            stdout_handler.setFormatter(
+                logging.Formatter('[%(asctime)s] %(message)s', '%Y-%m-%d %H:%M:%S'))
+            _LOG_LISTENER = logging.handlers.QueueListener(log_queue, stdout_handler)
+            _LOG_LISTENER.start()
+            _LOG_PID = os.getpid()
+    return _LOG_LISTENER
+
+
+# Static fragments of the HTML directory listing, pre-encoded once.
+_LISTING_HEAD = (b'<!DOCTYPE HTML>\n<html><head>\n'
+                 b'<meta http-equiv="Content-Type" content="text/html; charset=utf-8">\n'
+                 b'<title>Directory listing for ')
+_LISTING_H1 = b'</title></head>\n<body>\n<h1>Directory listing for '
+_LISTING_LIST_OPEN = b'</h1><hr><ul>'
+_LISTING_ITEM_OPEN = b'\n<li><a href="'
+_LISTING_ITEM_CLOSE = b'</a></li>'
+_LISTING_TAIL = b'\n</ul><hr></body></html>'
+
+
+# Content types served for known file extensions (lower-case, no dot).
+_CTYPES = {
+    'html': 'text/html', 'htm': 'text/html',
+    'css': 'text/css',
+    'js': 'application/javascript',
+    'json': 'application/json',
+    'png': 'image/png',
+    'jpg': 'image/jpeg', 'jpeg': 'image/jpeg',
+    'gif': 'image/gif',
+    'svg': 'image/svg+xml',
+    'pdf': 'application/pdf',
+    'zip': 'application/zip',
+    'txt': 'text/plain',
+    'py': 'text/x-python',
+    'md': 'text/markdown',
+}
+
+
+@functools.lru_cache(maxsize=4096)
+def _ext_to_ctype(ext):
+    """Map a raw file extension to its content type."""
+    return _CTYPES.get(ext.lower(), 'application/octet-stream')
+
+
+class _MtimeCache:
+    """Thread-safe LRU of rendered bodies, each tagged with an mtime.
+    
+    A directory's mtime changes whenever an entry is added, removed or
+    renamed, so it is a cheap validity check for a rendered listing.
+    """
+    
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key, mtime_ns):
+        """Return the body cached for key if it was rendered at mtime_ns."""
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is None or cached[0] != mtime_ns:
+                return None
+            self._entries.move_to_end(key)
+            return cached[1]
+    
+    def put(self, key, mtime_ns, body):
+        with self._lock:
+            self._entries[key] = (mtime_ns, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+# Rendered /api/list bodies keyed by (fs_path, requested_path).
+_LISTING_CACHE = _MtimeCache(128)
+# Rendered HTML directory pages keyed by fs_path.
+_HTML_LISTING_CACHE = _MtimeCache(512)
+
+
+class _FDEntry:
+    """One open descriptor held by an _FDCache."""
+    
+    __slots__ = ('fd', 'version', 'refs', 'cached', 'used')
+    
+    def __init__(self, fd, version):
+        self.fd = fd
+        self.version = version
+        self.refs = 1
+        self.cached = True
+        self.used = time.monotonic()
+
+
+def _file_version(st):
+    """What must match for a cached descriptor to stand in for a path.
+    
+    chmod and chown only touch ctime, so it is checked too: a file whose
+    permissions were revoked must be reopened, and refused.
+    """
+    return (st.st_mtime_ns, st.st_ctime_ns, st.st_size)
+
+
+class _CachedFile:
+    """File-like handle on a descriptor borrowed from an _FDCache.
+    
+    Only the calls copyfile() makes are supported; close() hands the
+    descriptor back to the cache instead of closing it.
+    """
+    
+    def __init__(self, cache, entry, st):
+        self._cache = cache
+        self._entry = entry
+        self.st = st
+    
+    def fileno(self):
+        return self._entry.fd
+    
+    def tell(self):
+        return 0
+    
+    def close(self):
+        if self._entry is not None:
+            self._cache.release(self._entry)
+            self._entry = None
+
+
+class _FDCache:
+    """LRU of open read-only descriptors keyed by (st_dev, st_ino).
+    
+    Entries are reference counted, so a descriptor evicted while a transfer
+    is still using it is closed only once that transfer releases it. A
+    sweeper thread, running while the cache is not empty, closes entries
+    left idle for idle_ttl seconds and, within sweep_interval, those whose
+    file has been deleted, so their disk space is freed on a quiet server.
+    """
+    
+    sweep_interval = 5
+    idle_ttl = 30
+    
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._sweeper = None
+    
+    def open(self, path, st):
+        """Return a _CachedFile for path, given its current stat result."""
+        key = (st.st_dev, st.st_ino)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.version == _file_version(st):
+                entry.refs += 1
+                entry.used = time.monotonic()
+                self._entries.move_to_end(key)
+                return _CachedFile(self, entry, st)
+        
+        fd = os.open(path, os.O_RDONLY | getattr(os, 'O_CLOEXEC', 0))
+        try:
+            # Re-stat the descriptor in case path was replaced meanwhile.
+            st = os.fstat(fd)
+        except OSError:
+            os.close(fd)
+            raise
+        key = (st.st_dev, st.st_ino)
+        entry = _FDEntry(fd, _file_version(st))
+        with self._lock:
+            stale = self._entries.pop(key, None)
+            if stale is not None:
+                self._discard(stale)
+            self._entries[key] = entry
+            while len(self._entries) > self.maxsize:
+                self._discard(self._entries.popitem(last=False)[1])
+            if self._sweeper is None:
+                self._sweeper = threading.Thread(
+                    target=self._sweep, daemon=True, name="fd-cache-sweeper")
+                self._sweeper.start()
+        return _CachedFile(self, entry, st)
+    
+    def release(self, entry):
+        with self._lock:
+            entry.refs -= 1
+            entry.used = time.monotonic()
+            if entry.refs == 0 and not entry.cached:
+                os.close(entry.fd)
+    
+    def _sweep(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            with self._lock:
+                idle_since = time.monotonic() - self.idle_ttl
+                for key, entry in list(self._entries.items()):
+                    try:
+                        deleted = os.fstat(entry.fd).st_nlink == 0
+                    except OSError:
+                        deleted = True
+                    if deleted or (entry.refs == 0 and entry.used < idle_since):
+                        del self._entries[key]
+                        self._discard(entry)
+                if not self._entries:
+                    self._sweeper = None
+                    return
+    
+    def _discard(self, entry):
+        # Caller holds the lock.
+        entry.cached = False
+        if entry.refs == 0:
+            os.close(entry.fd)
+
+
+# Descriptors are only reused where copyfile() can sendfile() from them.
+_FD_CACHE = _FDCache(256) if hasattr(os, 'sendfile') else None
 
 
 class FileBrowserHandler(SimpleHTTPRequestHandler):
     """HTTP request handler for file browsing with JSON API."""
     
+    # Keep connections open between requests; every response carries a
+    # Content-Length or is chunk-encoded.
+    protocol_version = "HTTP/1.1"
+    # Idle keep-alive connections are dropped after this many seconds, or
+    # as soon as another connection is waiting for a worker.
+    timeout = 15
+    # How often an idle keep-alive connection checks for waiting ones.
+    idle_poll_interval = 0.05
+    # Streamed responses are flushed to the socket in pieces of this size.
+    stream_chunk_size = 8 * 1024
+    # Bodies up to this size are sent in the same write as their headers.
+    coalesce_limit = 64 * 1024
+    # Rendered listings (/api/list bodies and HTML directory pages) larger
+    # than this are not cached.
+    listing_cache_limit = 1024 * 1024
+    # Content-Length of the file body send_head() last announced.
+    body_length = None
+    
     def __init__(self, *args, directory=None, **kwargs):
         self.directory = os.path.abspath(directory) if directory else os.getcwd()
-        super().__init__(*args, **kwargs)
+        self._dir_prefix = os.path.join(self.directory, '')
+        super().__init__(*args, directory=self.directory, **kwargs)
+    
+    def setup(self):
+        super().setup()
+        # Small responses should not sit behind Nagle's algorithm; large
+        # ones are coalesced explicitly with TCP_CORK.
+        try:
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except OSError:
+            pass
+    
+    def handle(self):
+        """Serve requests on the connection until it closes or goes idle."""
+        self.close_connection = True
+        self.handle_one_request()
+        while not self.close_connection and self.wait_for_request():
+            self.handle_one_request()
+    
+    def wait_for_request(self):
+        """Wait for the next keep-alive request.
+        
+        Returns False if the connection should be closed instead: it stayed
+        idle for `timeout` seconds, or the server has other connections
+        queued for a worker.
+        """
+        if self.request_buffered():
+            return True
+        busy = getattr(self.server, 'has_waiting_connections', None)
+        deadline = time.monotonic() + self.timeout
+        with selectors.DefaultSelector() as selector:
+            selector.register(self.connection, selectors.EVENT_READ)
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                if busy is None:
+                    return bool(selector.select(remaining))
+                if selector.select(min(remaining, self.idle_poll_interval)):
+                    return True
+                if busy():
+                    return False
+    
+    def request_buffered(self):
+        """Return True if a pipelined request is already in rfile's buffer."""
+        self.connection.settimeout(0)
+        try:
+            # With a non-blocking socket peek() returns only what is
+            # buffered, plus whatever the socket has ready.
+            return bool(self.rfile.peek(1))
+        except OSError:
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
     
     def translate_path(self, path):
         """Translate URL path to file system path."""
         path = path.split('?', 1)[0]
         path = path.split('#', 1)[0]
+        return self.resolve_path(urllib.parse.unquote(path))
+    
+    def resolve_path(self, path):
+        """Map an already-decoded URL path onto the served directory.
         
-        if path == '/' or path == '':
+        Paths that would leave the served directory resolve to its root.
+        """
+        if os.sep != '/':
+            path = path.replace(os.sep, '/')
+        # Normalizing as an absolute path collapses every leading '..'.
+        safe = posixpath.normpath('/' + path).lstrip('/')
+        if not safe or safe == '.':
             return self.directory
         
-        path = os.path.normpath(path)
-        if path.startswith('/'):
-            path = path[1:]
-        
-        words = path.split('/')
-        words = [w for w in words if w and w not in ('.', '..')]
-        
-        full_path = self.directory
-        for word in words:
-            full_path = os.path.join(full_path, word)
-        
-        full_path = os.path.abspath(full_path)
-        if not full_path.startswith(self.directory):
+        full_path = os.path.join(self.directory, safe)
+        if not full_path.startswith(self._dir_prefix):
             return self.directory
         
         return full_path
     
     def do_GET(self):
         """Handle GET requests."""
-        if self.path.startswith('/api/list'):
-            self.handle_api_list()
+        # Hold back partial frames so the headers and the start of the
+        # body leave in the same packet.
+        self.set_cork(True)
+        try:
+            if self.path.startswith('/api/list'):
+                self.handle_api_list()
+                return
+            
+            f = self.send_head()
+            if f:
+                try:
+                    if isinstance(f, bytes):
+                        self.wfile.write(f)
+                    else:
+                        self.copyfile(f, self.wfile)
+                finally:
+                    if not isinstance(f, bytes):
+                        f.close()
+        finally:
+            self.set_cork(False)
+    
+    def set_cork(self, enabled):
+        """Toggle TCP_CORK on the client socket where the platform has it."""
+        if not hasattr(socket, 'TCP_CORK'):
             return
+        try:
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_CORK, int(enabled))
+        except OSError:
+            pass
+    
+    def end_headers_with_body(self, body):
+        """Finish the headers and send body, in one write when it is small.
         
-        f = self.send_head()
-        if f:
-            try:
-                if isinstance(f, bytes):
-                    self.wfile.write(f)
-                else:
-                    self.copyfile(f, self.wfile)
-            finally:
-                if not isinstance(f, bytes):
-                    f.close()
+        Larger bodies are written separately; the caller is expected to have
+        the socket corked so the kernel still coalesces the two.
+        """
+        if len(body) <= self.coalesce_limit and hasattr(self, '_headers_buffer'):
+            self._headers_buffer.append(b"\r\n")
+            self._headers_buffer.append(body)
+            self.flush_headers()
+        else:
+            self.end_headers()
+            self.wfile.write(body)
+    
+    def copyfile(self, source, outputfile):
+        """Copy a file body to the client, using sendfile(2) when possible.
+        
+        Exactly the Content-Length advertised by send_head() is sent, even
+        if the file has grown since; if it has shrunk the connection is
+        closed, since the response can no longer be framed correctly.
+        """
+        remaining = self.body_length
+        self.body_length = None
+        try:
+            infd = source.fileno()
+        except (AttributeError, io.UnsupportedOperation):
+            infd = None
+        if remaining is None:
+            if infd is None:
+                super().copyfile(source, outputfile)
+                return
+            remaining = os.fstat(infd).st_size - source.tell()
+        
+        if infd is None or not hasattr(os, 'sendfile'):
+            while remaining > 0:
+                buf = source.read(min(remaining, 64 * 1024))
+                if not buf:
+                    break
+                outputfile.write(buf)
+                remaining -= len(buf)
+            if remaining > 0:
+                self.close_connection = True
+            return
+        
+        # sendfile bypasses any buffered writer, so drain it first.
+        outputfile.flush()
+        offset = source.tell()
+        outfd = outputfile.fileno()
+        selector = None
+        try:
+            while remaining > 0:
+                try:
+                    sent = os.sendfile(outfd, infd, offset, remaining)
+                except BlockingIOError:
+                    # A socket timeout puts the fd in non-blocking mode;
+                    # wait for buffer space within that timeout.
+                    if selector is None:
+                        selector = selectors.DefaultSelector()
+                        selector.register(outfd, selectors.EVENT_WRITE)
+                    if not selector.select(self.connection.gettimeout()):
+                        raise TimeoutError("timed out sending file")
+                    continue
+                if sent == 0:
+                    break
+                offset += sent
+                remaining -= sent
+        finally:
+            if selector is not None:
+                selector.close()
+        if remaining > 0:
+            # The file shrank: fewer bytes went out than were promised.
+            self.close_connection = True
     
     def handle_api_list(self):
-        """Handle /api/list endpoint for JSON directory listings."""
-        parsed_path = urllib.parse.urlparse(self.path)
-        query_params = urllib.parse.parse_qs(parsed_path.query)
-        requested_path = query_params.get('path', ['/'])[0]
+        """Handle /api/list endpoint for JSON directory listings.
+        
+        With format=ndjson the entries are sent one JSON object per line,
+        unsorted and as the directory is read, so a client can render the
+        first rows before a large directory has been walked.
+        """
+        query = self.path.partition('?')[2].partition('#')[0]
+        if query.startswith('path=') and '&' not in query:
+            # Fast path for a bare path parameter.
+            requested_path = urllib.parse.unquote_plus(query[5:]) or '/'
+            ndjson = False
+        else:
+            query_params = urllib.parse.parse_qs(query)
+            requested_path = query_params.get('path', ['/'])[0]
+            ndjson = query_params.get('format', [''])[0] == 'ndjson'
         
         if not requested_path.startswith('/'):
             requested_path = '/' + requested_path
         
-        fs_path = self.translate_path(requested_path)
-        if not fs_path.startswith(self.directory):
-            fs_path = self.directory
-        
-        files = []
+        fs_path = self.resolve_path(requested_path)
+        if ndjson:
+            ctype = "application/x-ndjson; charset=utf-8"
+        else:
+            ctype = "application/json; charset=utf-8"
         
         try:
-            if os.path.isdir(fs_path):
-                entries = os.listdir(fs_path)
-                for name in entries:
-                    full_path = os.path.join(fs_path, name)
-                    try:
-                        stat_info = os.stat(full_path)
-                        
-                        rel_path = os.path.relpath(full_path, self.directory)
-                        if rel_path == '.':
-                            url_path = '/' + name
-                        else:
-                            url_path = '/' + rel_path.replace(os.sep, '/')
-                        
-                        if os.path.isdir(full_path) and not url_path.endswith('/'):
-                            url_path += '/'
-                        
-                        file_info = {
-                            'name': name,
-                            'path': url_path,
-                            'type': 'directory' if os.path.isdir(full_path) else 'file',
-                            'size': stat_info.st_size if os.path.isfile(full_path) else None,
-                            'modified': datetime.fromtimestamp(stat_info.st_mtime).isoformat()
-                        }
-                        files.append(file_info)
-                    except (OSError, PermissionError):
-                        continue
-                
-                files.sort(key=lambda x: (x['type'] != 'directory', x['name'].lower()))
-                
-                response_data = json.dumps({'files': files, 'path': requested_path})
-                response_bytes = response_data.encode('utf-8')
-                
+            try:
+                dir_st = os.stat(fs_path)
+            except (OSError, ValueError):
+                # ValueError: the path contains a NUL byte.
+                dir_st = None
+            if dir_st is None or not stat.S_ISDIR(dir_st.st_mode):
+                self.send_error(400, "Path is not a directory")
+                return
+            
+            # Only the directory's own mtime is checked: it changes when
+            # entries are added, removed or renamed, but not when a child
+            # file is rewritten in place, so a cached listing can report a
+            # stale size or modified time until the directory next changes.
+            # Requests sent with Cache-Control: no-cache (the UI's Refresh
+            # button, or a hard reload) skip the cache and replace it.
+            cache_key = (fs_path, requested_path, ndjson)
+            if 'no-cache' in self.headers.get('Cache-Control', ''):
+                cached = None
+            else:
+                cached = _LISTING_CACHE.get(cache_key, dir_st.st_mtime_ns)
+            if cached is not None:
                 self.send_response(200)
-                self.send_header("Content-type", "application/json; charset=utf-8")
-                self.send_header("Content-Length", str(len(response_bytes)))
+                self.send_header("Content-type", ctype)
+                self.send_header("Content-Length", str(len(cached)))
                 self.send_header("Access-Control-Allow-Origin", "*")
-                self.end_headers()
-                self.wfile.write(response_bytes)
-            else:
-                self.send_error(400, "Path is not a directory")
+                self.end_headers_with_body(cached)
+                return
+            
+            entries = os.scandir(fs_path)
+            if not ndjson:
+                with entries:
+                    files = sorted(self.iter_listing(entries), key=itemgetter(0))
         except Exception as e:
             self.send_error(500, f"Error listing directory: {str(e)}")
+            return
+        
+        if ndjson:
+            with entries:
+                self.send_listing(self.ndjson_pieces(entries), ctype,
+                                  cache_key, dir_st.st_mtime_ns)
+        else:
+            self.send_listing(self.json_pieces(requested_path, files), ctype,
+                              cache_key, dir_st.st_mtime_ns)
+    
+    def iter_listing(self, entries):
+        """Yield a (sort key, file info) pair for each scandir() entry."""
+        for entry in entries:
+            name = entry.name
+            try:
+                # DirEntry caches d_type and stat results, so only
+                # symlinks cost an extra syscall here.
+                is_dir = entry.is_dir()
+                is_file = entry.is_file()
+                stat_info = entry.stat()
+                
+                rel_path = os.path.relpath(entry.path, self.directory)
+                if rel_path == '.':
+                    url_path = '/' + name
+                else:
+                    url_path = '/' + rel_path.replace(os.sep, '/')
+                
+                if is_dir and not url_path.endswith('/'):
+                    url_path += '/'
+                
+                file_info = {
+                    'name': name,
+                    'path': url_path,
+                    'type': 'directory' if is_dir else 'file',
+                    'size': stat_info.st_size if is_file else None,
+                    'modified': datetime.fromtimestamp(stat_info.st_mtime, tz=timezone.utc)
+                }
+            except (OSError, PermissionError):
+                continue
+            # Sort key is built once per entry, not per comparison.
+            yield (not is_dir, name.lower()), file_info
+    
+    def json_pieces(self, requested_path, files):
+        """Yield the JSON listing body for sorted iter_listing() pairs."""
+        yield b'{"path":'
+        yield json_bytes(requested_path)
+        yield b',"files":['
+        for i, (_, file_info) in enumerate(files):
+            if i:
+                yield b','
+            yield json_bytes(file_info)
+        yield b']}'
+    
+    def ndjson_pieces(self, entries):
+        """Yield one JSON line per scandir() entry, in directory order."""
+        for _, file_info in self.iter_listing(entries):
+            yield json_bytes(file_info)
+            yield b'\n'
+    
+    def send_listing(self, pieces, ctype, cache_key, mtime_ns):
+        """Stream a listing body and cache it if it turns out small enough."""
+        # Headers are committed from here on, so the body is streamed in
+        # fixed-size chunks instead of being serialized in one piece.
+        chunked = self.start_stream(200, ctype)
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        
+        # Chunks are kept for the cache only while the body stays small
+        # enough to be worth caching.
+        parts = []
+        cached_size = 0
+        buf = bytearray()
+        for piece in pieces:
+            buf += piece
+            if len(buf) >= self.stream_chunk_size:
+                chunk = bytes(buf)
+                if parts is not None:
+                    cached_size += len(chunk)
+                    if cached_size <= self.listing_cache_limit:
+                        parts.append(chunk)
+                    else:
+                        parts = None
+                self.write_chunk(chunk, chunked)
+                buf.clear()
+        chunk = bytes(buf)
+        self.write_chunk(chunk, chunked)
+        if chunked:
+            self.wfile.write(b'0\r\n\r\n')
+        
+        if parts is not None and cached_size + len(chunk) <= self.listing_cache_limit:
+            parts.append(chunk)
+            _LISTING_CACHE.put(cache_key, mtime_ns, b''.join(parts))
+    
+    def start_stream(self, code, ctype):
+        """Send the status line and headers for a body of unknown length.
+        
+        Returns True if the body must be chunk-encoded; HTTP/1.0 peers get
+        a plain body terminated by closing the connection instead.
+        """
+        self.send_response(code)
+        self.send_header("Content-type", ctype)
+        chunked = (self.protocol_version >= "HTTP/1.1"
+                   and self.request_version >= "HTTP/1.1")
+        if chunked:
+            self.send_header("Transfer-Encoding", "chunked")
+        else:
+            self.send_header("Connection", "close")
+            self.close_connection = True
+        return chunked
+    
+    def write_chunk(self, data, chunked):
+        """Write one piece of a streamed body started with start_stream()."""
+        if not data:
+            return
+        if chunked:
+            self.wfile.write(b'%X\r\n%s\r\n' % (len(data), data))
+        else:
+            self.wfile.write(data)
     
     def send_head(self):
         """Send response headers and return file object or directory listing."""
         path = self.translate_path(self.path)
         
-        if not os.path.exists(path):
+        # One stat() answers existence, type and permission up front.
+        try:
+            st = os.stat(path)
+        except PermissionError:
+            self.send_error(403, "Permission denied")
+            return None
+        except (OSError, ValueError):
+            # ValueError: the path contains a NUL byte.
             self.send_error(404, "File not found")
             return None
         
-        if os.path.isdir(path):
+        if stat.S_ISDIR(st.st_mode):
             index_path = os.path.join(path, 'index.html')
-            if os.path.isfile(index_path):
+            try:
+                index_st = os.stat(index_path)
+            except OSError:
+                index_st = None
+            if index_st is not None and stat.S_ISREG(index_st.st_mode):
                 self.path = self.path.rstrip('/') + '/index.html'
                 path = index_path
+                st = index_st
             
-            if os.path.isdir(path):
+            if stat.S_ISDIR(st.st_mode):
                 if not self.path.endswith('/'):
                     self.send_response(301)
                     self.send_header("Location", self.path + '/')
+                    self.send_header("Content-Length", "0")
                     self.end_headers()
                     return None
                 return self.list_directory(path)
         
         try:
-            f = open(path, 'rb')
+            if _FD_CACHE is not None:
+                f = _FD_CACHE.open(path, st)
+                fs = f.st
+            else:
+                f = open(path, 'rb')
+                fs = os.fstat(f.fileno())
         except IOError:
             self.send_error(403, "Permission denied")
             return None
         
-        fs = os.fstat(f.fileno())
         ctype = self.guess_type(path)
         
         self.send_response(200)
@@ -161,48 +732,68 @@ class FileBrowserHandler(SimpleHTTPRequestHandler):
         self.send_header("Content-Length", str(fs[6]))
         self.send_header("Last-Modified", self.date_time_string(fs.st_mtime))
         self.end_headers()
+        self.body_length = fs[6]
         return f
     
     def list_directory(self, path):
         """Generate directory listing page."""
         try:
-            entries = os.listdir(path)
-            entries.sort(key=lambda a: a.lower())
-            
-            if 'index.html' in entries:
-                index_path = os.path.join(path, 'index.html')
-                if os.path.isfile(index_path):
-                    self.path = self.path.rstrip('/') + '/index.html'
-                    return self.translate_path(self.path)
-            
-            html = []
-            html.append('<!DOCTYPE HTML>')
-            html.append('<html><head>')
-            html.append('<meta http-equiv="Content-Type" content="text/html; charset=utf-8">')
-            html.append(f'<title>Directory listing for {self.path}</title></head>')
-            html.append('<body>')
-            html.append(f'<h1>Directory listing for {self.path}</h1><hr><ul>')
-            
-            if self.path != '/' and self.path != '':
-                parent_path = os.path.dirname(self.path.rstrip('/'))
-                if not parent_path:
-                    parent_path = '/'
-                html.append(f'<li><a href="{parent_path}">..</a></li>')
-            
-            for name in entries:
-                fullname = os.path.join(path, name)
-                displayname = name
-                linkname = name
+            mtime_ns = os.stat(path).st_mtime_ns
+            # The page is rendered from the directory's normalized URL
+            # path rather than self.path, so spellings such as /a//, /a/./
+            # or /a/?x share one cache entry.
+            cache_key = path
+            encoded = _HTML_LISTING_CACHE.get(cache_key, mtime_ns)
+            if encoded is None:
+                with os.scandir(path) as it:
+                    entries = [(entry.name, entry.is_dir()) for entry in it]
+                entries.sort(key=lambda a: a[0].lower())
                 
-                if os.path.isdir(fullname):
-                    displayname = name + "/"
-                    linkname = name + "/"
+                if any(name == 'index.html' for name, _ in entries):
+                    index_path = os.path.join(path, 'index.html')
+                    if os.path.isfile(index_path):
+                        self.path = self.path.rstrip('/') + '/index.html'
+                        return self.translate_path(self.path)
                 
-                html.append(f'<li><a href="{linkname}">{displayname}</a></li>')
-            
-            html.append('</ul><hr></body></html>')
+                rel_path = os.path.relpath(path, self.directory)
+                if rel_path == '.':
+                    url_path = '/'
+                else:
+                    url_path = '/' + rel_path.replace(os.sep, '/') + '/'
+                
+                title = html.escape(url_path).encode('utf-8', 'surrogateescape')
+                buf = bytearray(_LISTING_HEAD)
+                buf += title
+                buf += _LISTING_H1
+                buf += title
+                buf += _LISTING_LIST_OPEN
+                
+                if url_path != '/':
+                    parent_path = os.path.dirname(url_path.rstrip('/'))
+                    if not parent_path:
+                        parent_path = '/'
+                    buf += _LISTING_ITEM_OPEN
+                    buf += html.escape(parent_path).encode('utf-8', 'surrogateescape')
+                    buf += b'">..</a></li>'
+                
+                for name, is_dir in entries:
+                    # One escaped copy serves as both the link target and the text.
+                    esc = html.escape(name).encode('utf-8', 'surrogateescape')
+                    suffix = b'/' if is_dir else b''
+                    buf += _LISTING_ITEM_OPEN
+                    buf += esc
+                    buf += suffix
+                    buf += b'">'
+                    buf += esc
+                    buf += suffix
+                    buf += _LISTING_ITEM_CLOSE
+                
+                buf += _LISTING_TAIL
+                
+                encoded = bytes(buf)
+                if len(encoded) <= self.listing_cache_limit:
+                    _HTML_LISTING_CACHE.put(cache_key, mtime_ns, encoded)
             
-            encoded = '\n'.join(html).encode('utf-8', 'surrogateescape')
             self.send_response(200)
             self.send_header("Content-type", "text/html; charset=utf-8")
             self.send_header("Content-Length", str(len(encoded)))
@@ -215,35 +806,110 @@ class FileBrowserHandler(SimpleHTTPRequestHandler):
     
     def guess_type(self, path):
         """Guess content type based on file extension."""
-        base, ext = os.path.splitext(path)
-        ext = ext.lower()
-        types = {
-            '': 'application/octet-stream',
-            '.html': 'text/html', '.htm': 'text/html',
-            '.css': 'text/css',
-            '.js': 'application/javascript',
-            '.json': 'application/json',
-            '.png': 'image/png',
-            '.jpg': 'image/jpeg', '.jpeg': 'image/jpeg',
-            '.gif': 'image/gif',
-            '.svg': 'image/svg+xml',
-            '.pdf': 'application/pdf',
-            '.zip': 'application/zip',
-            '.txt': 'text/plain',
-            '.py': 'text/x-python',
-            '.md': 'text/markdown',
-        }
-        return types.get(ext, 'application/octet-stream')
+        _, dot, ext = path.rpartition('.')
+        return _ext_to_ctype(ext if dot else '')
     
     def log_message(self, format, *args):
         """Override to customize logging."""
-        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {format % args}")
+        if _LOG_PID != os.getpid():
+            # Embedders that never called start_file_server() get the
+            # listener on first use.
+            start_log_listener()
+        _log.info(format, *args)
+
+
+class PooledHTTPServer(ThreadingHTTPServer):
+    """ThreadingHTTPServer that hands connections to a fixed worker pool.
+    
+    The acceptor thread only queues accepted sockets; max_workers daemon
+    threads process them, so a burst of clients cannot spawn an unbounded
+    number of threads and shutdown never waits on in-flight downloads.
+    
+    A worker stays with its connection between keep-alive requests, but
+    FileBrowserHandler closes an idle connection as soon as another one is
+    queued, so at most max_workers requests are served concurrently while
+    idle clients never lock out new ones.
+    """
+    
+    daemon_threads = True
+    request_queue_size = 128
+    
+    def __init__(self, *args, max_workers=None, reuse_port=False, **kwargs):
+        self.reuse_port = reuse_port
+        # Sibling acceptor processes forked by start_file_server().
+        self.acceptor_pids = []
+        if max_workers is None:
+            # Workers mostly wait on sockets and disks, not the CPU.
+            max_workers = 32
+        self._pending = queue.SimpleQueue()
+        self._workers = [
+            threading.Thread(target=self._worker, daemon=True, name=f"http-worker-{i}")
+            for i in range(max_workers)
+        ]
+        super().__init__(*args, **kwargs)
+        for worker in self._workers:
+            worker.start()
+    
+    def server_bind(self):
+        # With SO_REUSEPORT several processes can each bind the port and the
+        # kernel spreads incoming connections across their accept queues.
+        if self.reuse_port:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+    
+    def process_request(self, request, client_address):
+        """Queue the connection for the next free worker."""
+        self._pending.put((request, client_address))
+    
+    def has_waiting_connections(self):
+        """Return True if accepted connections are queued for a worker."""
+        return not self._pending.empty()
+    
+    def _worker(self):
+        while True:
+            item = self._pending.get()
+            if item is None:
+                return
+            self.process_request_thread(*item)
+    
+    def server_close(self):
+        super().server_close()
+        for _ in self._workers:
+            self._pending.put(None)
+        _stop_acceptors(self.acceptor_pids)
+        self.acceptor_pids = []
+
+
+def _stop_acceptors(pids):
+    """Terminate forked acceptor processes and reap them."""
+    for pid in pids:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    for pid in pids:
+        try:
+            os.waitpid(pid, 0)
+        except ChildProcessError:
+            pass
+
+
+def _die_with_parent(parent_pid):
+    """Have the kernel SIGTERM this process when its parent exits (Linux)."""
+    if sys.platform.startswith('linux'):
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            libc.prctl(1, signal.SIGTERM)  # PR_SET_PDEATHSIG
+        except (OSError, AttributeError):
+            pass
+    # The parent may already have gone before prctl() took effect.
+    if os.getppid() != parent_pid:
+        os._exit(0)
 
 
 def check_command(cmd):
     """Check if a command is available."""
-    result = subprocess.run(['which', cmd], capture_output=True, text=True)
-    return result.returncode == 0
+    return shutil.which(cmd) is not None
 
 
 def install_nodejs_npm():
@@ -261,7 +927,8 @@ def install_nodejs_npm():
             if check_command('brew'):
                 print("Installing Node.js via Homebrew...")
                 result = subprocess.run(['brew', 'install', 'node'], 
-                                      capture_output=True, text=True, timeout=600)
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                      text=True, timeout=600)
                 if result.returncode == 0:
                     print("✓ Node.js installed successfully.")
                     return True
@@ -273,24 +940,24 @@ def install_nodejs_npm():
                 return False
         
         elif system == "Linux":
-            if check_command('apt-get'):
+            # Stop probing PATH at the first package manager found.
+            pkg_mgr = next((m for m in ('apt-get', 'yum', 'dnf') if check_command(m)), None)
+            if pkg_mgr == 'apt-get':
                 print("Installing Node.js via apt-get...")
-                subprocess.run(['sudo', 'apt-get', 'update'], timeout=300)
+                subprocess.run(['sudo', 'apt-get', 'update'], check=False, timeout=300,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
                 result = subprocess.run(['sudo', 'apt-get', 'install', '-y', 'nodejs', 'npm'],
-                                      capture_output=True, text=True, timeout=600)
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                      text=True, timeout=600)
                 if result.returncode == 0:
                     print("✓ Node.js installed successfully.")
                     return True
                 return False
-            elif check_command('yum'):
-                print("Installing Node.js via yum...")
-                result = subprocess.run(['sudo', 'yum', 'install', '-y', 'nodejs', 'npm'],
-                                      capture_output=True, text=True, timeout=600)
-                return result.returncode == 0
-            elif check_command('dnf'):
-                print("Installing Node.js via dnf...")
-                result = subprocess.run(['sudo', 'dnf', 'install', '-y', 'nodejs', 'npm'],
-                                      capture_output=True, text=True, timeout=600)
+            elif pkg_mgr is not None:
+                print(f"Installing Node.js via {pkg_mgr}...")
+                result = subprocess.run(['sudo', pkg_mgr, 'install', '-y', 'nodejs', 'npm'],
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                      text=True, timeout=600)
                 return result.returncode == 0
             else:
                 print("✗ Could not detect package manager.")
@@ -327,9 +994,12 @@ def install_localtunnel():
     print("Installing localtunnel globally...")
     try:
         result = subprocess.run(['npm', 'install', '-g', 'localtunnel'],
-                              capture_output=True, text=True, timeout=120)
+                              stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                              text=True, timeout=120)
         if result.returncode == 0:
             print("✓ Localtunnel installed successfully.")
+            # Forget any earlier "not found" so the next lookup re-probes.
+            _TOOL_CACHE.pop('lt', None)
             return True
         else:
             print(f"✗ Error installing localtunnel: {result.stderr}")
@@ -342,8 +1012,26 @@ def install_localtunnel():
         return False
 
 
-def start_file_server(directory=".", port=8085, host="0.0.0.0"):
-    """Start the HTTP file server."""
+def start_file_server(directory=".", port=8085, host="0.0.0.0", workers=None):
+    """Start the HTTP file server.
+    
+    workers > 1 (default: $FCTEST_ACCEPTOR_PROCS, else 1) forks that many
+    acceptor processes in total, each binding the port with SO_REUSEPORT.
+    The returned server belongs to the calling process; its server_close()
+    terminates the extra acceptors, which also exit if this process dies.
+    """
+    if workers is None:
+        env_workers = os.environ.get('FCTEST_ACCEPTOR_PROCS', '1')
+        try:
+            workers = int(env_workers)
+        except ValueError:
+            print(f"⚠ Ignoring invalid FCTEST_ACCEPTOR_PROCS={env_workers!r}; using one.")
+            workers = 1
+    workers = max(workers, 1)
+    if workers > 1 and not (hasattr(os, 'fork') and hasattr(socket, 'SO_REUSEPORT')):
+        print("⚠ Multiple acceptor processes need fork() and SO_REUSEPORT; using one.")
+        workers = 1
+    
     if directory == ".":
         directory = os.getcwd()
     else:
@@ -355,7 +1043,34 @@ def start_file_server(directory=".", port=8085, host="0.0.0.0"):
     def handler_factory(*args, **kwargs):
         return FileBrowserHandler(*args, directory=directory, **kwargs)
     
-    server = HTTPServer((host, port), handler_factory)
+    # Fork before this process starts any threads of its own.
+    parent_pid = os.getpid()
+    acceptor_pids = []
+    for _ in range(workers - 1):
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 1
+            try:
+                _die_with_parent(parent_pid)
+                child = PooledHTTPServer((host, port), handler_factory, reuse_port=True)
+                start_log_listener()
+                child.serve_forever()
+                exit_code = 0
+            except KeyboardInterrupt:
+                exit_code = 0
+            except BaseException:
+                traceback.print_exc()
+            finally:
+                os._exit(exit_code)
+        acceptor_pids.append(pid)
+    
+    try:
+        server = PooledHTTPServer((host, port), handler_factory, reuse_port=workers > 1)
+    except BaseException:
+        _stop_acceptors(acceptor_pids)
+        raise
+    server.acceptor_pids = acceptor_pids
+    start_log_listener()
     
     print(f"\n{'='*60}")
     print(f"✓ File server started successfully!")
@@ -369,14 +1084,28 @@ def start_file_server(directory=".", port=8085, host="0.0.0.0"):
     return server
 
 
-def expose_via_localtunnel(port=8085, subdomain='fctest123'):
+# Tool name -> resolved path (or None), filled in by _locate().
+_TOOL_CACHE = {}
+
+
+def _locate(tool):
+    """Return the path of tool on PATH, walking PATH only on first use."""
+    if tool not in _TOOL_CACHE:
+        _TOOL_CACHE[tool] = shutil.which(tool)
+    return _TOOL_CACHE[tool]
+
+# Matches the public URL localtunnel prints once the tunnel is up.
+_TUNNEL_URL_RE = re.compile(r'https://\S+\.loca\.lt')
+
+
+def expose_via_localtunnel(port=8085, subdomain='fctest123', timeout=10.0):
     """Expose the server via localtunnel."""
-    if not check_command('lt'):
+    if _locate('lt') is None:
         print("Localtunnel not found. Installing...")
         if not install_localtunnel():
             raise RuntimeError("Failed to install localtunnel")
     
-    cmd = ['lt', '--port', str(port)]
+    cmd = [_locate('lt') or 'lt', '--port', str(port)]
     if subdomain:
         cmd.extend(['--subdomain', subdomain])
     
@@ -384,19 +1113,40 @@ def expose_via_localtunnel(port=8085, subdomain='fctest123'):
     if subdomain:
         print(f"Requested subdomain: {subdomain}")
     
-    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    time.sleep(3)  # Wait for localtunnel to start
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                               text=True, bufsize=1)
     
-    # Try to read the URL from output
-    try:
-        stdout, stderr = process.communicate(timeout=1)
-        if stdout:
-            print(f"Localtunnel output: {stdout}")
-    except subprocess.TimeoutExpired:
-        pass
+    # Report the URL as soon as lt prints it; the reader keeps draining the
+    # pipe afterwards so later tunnel output stays visible.
+    url_ready = threading.Event()
+    found = {}
+    
+    def read_output():
+        for line in process.stdout:
+            print(f"Localtunnel output: {line.rstrip()}")
+            if 'url' not in found:
+                match = _TUNNEL_URL_RE.search(line)
+                if match:
+                    found['url'] = match.group(0)
+                    url_ready.set()
+        url_ready.set()  # lt closed its output before printing a URL
+    
+    def watch_exit():
+        # The pipe can outlive lt if a child inherited it, so also wake
+        # the caller as soon as lt itself exits.
+        process.wait()
+        url_ready.set()
+    
+    threading.Thread(target=read_output, daemon=True).start()
+    threading.Thread(target=watch_exit, daemon=True).start()
+    url_ready.wait(timeout)
+    
+    if 'url' in found:
+        print(f"✓ Public URL: {found['url']}")
+    elif process.poll() is not None:
+        raise RuntimeError(f"localtunnel exited with code {process.returncode}")
     
     print(f"✓ Localtunnel process started (PID: {process.pid})")
-    print("Check the output above for the public URL")
     print("The tunnel will remain active while the server is running\n")
     
     return process
@@ -412,10 +1162,6 @@ def main():
     print("="*60)
     print("Simple HTTP File Server with Internet Exposure")
     print("="*60)
-    print("\nInstalling dependencies...")
-    
-    # Install dependencies if needed
-    install_localtunnel()
     
     # Start file server
     server = start_file_server(directory, port, host)
@@ -448,8 +1194,11 @@ def main():
     except KeyboardInterrupt:
         print("\n\nShutting down...")
         server.shutdown()
+        server.server_close()
         if tunnel_process:
             tunnel_process.terminate()
+        # Flush any request logs still queued.
+        start_log_listener().stop()
         print("✓ Server stopped.")
 
 